@@ -1,14 +1,30 @@
 import os
+import io
+import sys
+import hashlib
+import time
+import queue
+import threading
+import numpy as np
+from numba import njit
 import pandas as pd
 import psycopg2
-from psycopg2 import sql
-from typing import Dict, List
+import psycopg2.pool
+from typing import List
 import logging
 from dotenv import load_dotenv
-import csv
-import locale
-import pandas as pd
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Backend io_uring para leitura dos arquivos (opcional, só Linux; instalar
+# com requirements-uring.txt). Versões do liburing sem a API cffi usada em
+# _read_files_uring são tratadas como indisponíveis
+try:
+    import liburing
+    if not all(hasattr(liburing, nome) for nome in ('io_uring_cqes', 'iovec')):
+        liburing = None
+except ImportError:
+    liburing = None
 
 # Carrega variáveis do arquivo .env
 load_dotenv()
@@ -17,6 +33,88 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Remove pontos de milhar e troca a vírgula decimal por ponto numa única
+# passada: "75.000,00" → "75000.00"
+BR_TO_EN_US = str.maketrans({'.': '', ',': '.'})
+
+# Versão do formato do cache em disco; mudar sempre que o tipo/estrutura do
+# resultado de fetch_reference_data mudar, para invalidar caches antigos
+CACHE_FORMAT = 2
+
+# Marca de fim de fila entre os estágios do pipeline de process_file
+_FIM = object()
+
+
+@njit(cache=True)
+def _parse_br_numbers(buf, offsets):
+    """
+    Converte números no formato brasileiro que não passaram pela conversão
+    vetorizada (ex: "R$ 1.234,56", "US$ -10,5").
+
+    Antes do primeiro dígito só são aceitos espaços, um sinal '-' e um único
+    prefixo R$ ou US$; depois dele, apenas dígitos, '.' de milhar (antes da
+    vírgula) e uma vírgula decimal, sempre entre dígitos.
+
+    :param buf: bytes UTF-8 de todos os valores concatenados (uint8)
+    :param offsets: posição inicial de cada valor em buf, mais o fim do último
+    :return: array float64, com NaN onde o valor não é um número
+    """
+    n = offsets.shape[0] - 1
+    out = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        mantissa = 0.0
+        casas = 0
+        digitos = 0
+        decimal = False
+        negativo = False
+        prefixo = False
+        anterior_digito = False
+        ok = True
+        j = offsets[i]
+        fim = offsets[i + 1]
+        while j < fim:
+            c = buf[j]
+            if 48 <= c <= 57:  # dígito
+                mantissa = mantissa * 10.0 + (c - 48)
+                digitos += 1
+                if decimal:
+                    casas += 1
+                anterior_digito = True
+            elif digitos > 0:
+                # Dentro do número: só separadores, e sempre após um dígito
+                if not anterior_digito:
+                    ok = False
+                elif c == 46 and not decimal:  # '.' separador de milhar
+                    anterior_digito = False
+                elif c == 44 and not decimal:  # ',' separador decimal
+                    decimal = True
+                    anterior_digito = False
+                else:
+                    ok = False
+            elif c == 32 or c == 9:  # espaços antes do número
+                pass
+            elif c == 45 and not negativo:  # '-'
+                negativo = True
+            elif c == 82 and not prefixo and j + 1 < fim and buf[j + 1] == 36:  # R$
+                prefixo = True
+                j += 1
+            elif (c == 85 and not prefixo and j + 2 < fim
+                  and buf[j + 1] == 83 and buf[j + 2] == 36):  # US$
+                prefixo = True
+                j += 2
+            else:
+                ok = False
+            if not ok:
+                break
+            j += 1
+
+        if ok and digitos > 0 and anterior_digito:
+            valor = mantissa / 10.0 ** casas
+            out[i] = -valor if negativo else valor
+        else:
+            out[i] = np.nan
+    return out
+
 class CSVProcessor:
     def __init__(self):
         """
@@ -33,6 +131,10 @@ class CSVProcessor:
             'password': os.getenv('DB_PASSWORD'),
             'port': os.getenv('DB_PORT', '5432')
         }
+
+        # Pool de conexões reaproveitado entre as consultas (criado no
+        # primeiro acesso ao banco)
+        self._pool = None
         
         # Verifica/Cria diretórios
         os.makedirs(self.input_dir, exist_ok=True)
@@ -41,64 +143,160 @@ class CSVProcessor:
         # Cache para dados do banco (opcional)
         self.db_cache = {}
 
-    def get_db_connection(self):
-        """Cria uma conexão com o banco PostgreSQL."""
+        # Cache em disco dos dados do banco, válido por CACHE_TTL segundos
+        # (CACHE_TTL=0 desativa). Fica fora do diretório de entrada, que
+        # recebe arquivos de terceiros
+        self.cache_dir = os.getenv('CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'iza-csv'))
+        self.cache_ttl = int(os.getenv('CACHE_TTL', '3600'))
+
+        # Quantidade de linhas lidas por vez do CSV
+        self.chunksize = int(os.getenv('CSV_CHUNKSIZE', '200000'))
+
+        # Leitura dos arquivos em lotes via io_uring (USE_URING=1); sem
+        # liburing ou fora do Linux usa a leitura síncrona
+        self._use_uring = os.getenv('USE_URING') == '1'
+        if self._use_uring and (liburing is None or not sys.platform.startswith('linux')):
+            logger.warning("io_uring indisponível, usando leitura síncrona.")
+            self._use_uring = False
+        self.uring_depth = int(os.getenv('URING_DEPTH', '64'))
+        self.uring_batch_bytes = int(os.getenv('URING_BATCH_BYTES', str(64 * 1024 * 1024)))
+
+        # Mapa ESTADO -> ID_PAIS, carregado uma única vez por instância
+        query = "select * from depara.codigo_pais"
+        estado_para_pais = self.fetch_reference_data(query, 'estado')
+        self._estado_id = estado_para_pais['id']
+
+        # Funções de process_data especializadas por cabeçalho de arquivo
+        self._fast_process = {}
+
+    def _create_pool(self):
+        """Cria o pool de conexões com o banco PostgreSQL."""
         try:
-            conn = psycopg2.connect(
-                host=self.db_config['host'],
-                database=self.db_config['database'],
-                user=self.db_config['user'],
-                password=self.db_config['password'],
-                port=self.db_config['port']
+            return psycopg2.pool.ThreadedConnectionPool(
+                1,
+                int(os.getenv('DB_POOL_MAX', '8')),
+                **self.db_config
             )
-            return conn
         except Exception as e:
             logger.error(f"Erro ao conectar ao banco de dados: {e}")
             raise
 
-    def fetch_reference_data(self, query: str, key_field: str = None, params: tuple = None) -> dict:
+    @contextmanager
+    def _conn(self):
+        """Empresta uma conexão do pool e a devolve ao final do bloco."""
+        if self._pool is None:
+            self._pool = self._create_pool()
+        conn = self._pool.getconn()
+        try:
+            yield conn
+        finally:
+            self._pool.putconn(conn)
+
+    def close(self):
+        """Fecha todas as conexões do pool."""
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    def _disk_cache_path(self, cache_key: str) -> str:
+        """Caminho do arquivo de cache em disco para a chave informada."""
+        h = hashlib.sha1(cache_key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, h + '.parquet')
+
+    def _load_disk_cache(self, cache_key: str):
+        """Lê do disco o resultado de uma consulta, se existir e não tiver expirado."""
+        if self.cache_ttl <= 0:
+            return None
+
+        path = self._disk_cache_path(cache_key)
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) >= self.cache_ttl:
+            return None
+
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Cache em disco inválido, consultando o banco: {e}")
+            return None
+
+    def _save_disk_cache(self, cache_key: str, data: pd.DataFrame):
+        """Grava em disco o resultado de uma consulta."""
+        if self.cache_ttl <= 0:
+            return
+
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        path = self._disk_cache_path(cache_key)
+
+        # Escreve em arquivo temporário e renomeia, para que outro processo
+        # nunca leia um cache pela metade
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            data.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o cache em disco: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def fetch_reference_data(self, query: str, key_field: str = None, params: tuple = None) -> pd.DataFrame:
         """
-        Busca dados de referência e retorna como dicionário indexado por key_field
+        Busca dados de referência e retorna como DataFrame indexado por key_field
         
         Args:
             query: Query SQL para executar
-            key_field: Campo para usar como chave do dicionário (opcional)
+            key_field: Campo para usar como índice do DataFrame (opcional)
             params: Parâmetros para a query (opcional)
             
         Returns:
-            dict: Dicionário com os resultados indexados pela chave especificada
-                Se key_field não for especificado, retorna lista tradicional
+            pd.DataFrame: Resultados indexados pela chave especificada (linhas
+                com chave nula são descartadas). Se key_field não for
+                especificado, usa o índice padrão
         """
         cache_key = f"{query}{params}{key_field}"
         if cache_key in self.db_cache:
             return self.db_cache[cache_key]
-            
-        try:
-            conn = self.get_db_connection()
-            with conn.cursor() as cursor:
-                cursor.execute(query, params or ())
-                columns = [desc[0] for desc in cursor.description]
-                results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-                
-                # Transforma em dicionário se key_field for especificado
-                if key_field:
-                    result_dict = {}
-                    for item in results:
-                        key = item.get(key_field)
-                        if key is not None:
-                            result_dict[key] = item
-                    self.db_cache[cache_key] = result_dict
-                    return result_dict
+
+        # O cache em disco guarda o resultado bruto da consulta e inclui o
+        # banco de origem na chave, para não servir dados de outro banco
+        disk_key = (
+            f"v{CACHE_FORMAT}|{self.db_config['host']}:{self.db_config['port']}/"
+            f"{self.db_config['database']}:{self.db_config['user']}|{query}|{params}"
+        )
+        results = self._load_disk_cache(disk_key)
+
+        # Descarta cache com estrutura inesperada e consulta o banco de novo
+        if results is not None and (
+            not isinstance(results, pd.DataFrame)
+            or (key_field and key_field not in results.columns)
+        ):
+            logger.warning("Cache em disco com formato inesperado, consultando o banco.")
+            results = None
+        if results is None:
+            try:
+                with self._conn() as conn, conn.cursor() as cursor:
+                    cursor.execute(query, params or ())
+                    columns = [desc[0] for desc in cursor.description]
                     
-                self.db_cache[cache_key] = results
-                return results
-                
-        except Exception as e:
-            logger.error(f"Erro ao buscar dados de referência: {e}")
-            raise
-        finally:
-            if conn:
-                conn.close()
+                    # Monta o resultado por coluna, direto do cursor, sem criar
+                    # um dicionário por linha
+                    results = pd.DataFrame.from_records(cursor, columns=columns)
+                    
+            except Exception as e:
+                logger.error(f"Erro ao buscar dados de referência: {e}")
+                raise
+
+            self._save_disk_cache(disk_key, results)
+
+        # Indexa pelo key_field se especificado (mantendo a última linha em
+        # caso de chave repetida)
+        if key_field:
+            results = (
+                results.dropna(subset=[key_field])
+                .drop_duplicates(subset=[key_field], keep='last')
+                .set_index(key_field, drop=False)
+            )
+
+        self.db_cache[cache_key] = results
+        return results
                 
     def _convert_br_to_en_us(self, series):
         """
@@ -106,26 +304,31 @@ class CSVProcessor:
         Ex: "75.000,00" → 75000.00 (float)
             "78,57" → 78.57 (float)
         """
-        def convert_single(value):
-            if pd.isna(value):
-                return value
-                
-            # Se já for numérico, não precisa converter
-            if isinstance(value, (int, float)):
-                return value
-                
-            # Converte para string e limpa
-            str_value = str(value).strip()
-            
-            try:
-                # Remove pontos de milhar e substitui vírgula decimal por ponto
-                clean_num = str_value.replace('.', '').replace(',', '.')
-                return float(clean_num)
-            except ValueError:
-                return value  # Mantém original se falhar a conversão
-        
-        # Aplica a conversão para cada valor da Series
-        return series.apply(convert_single)    
+        # Se já for numérico, não precisa converter
+        if pd.api.types.is_numeric_dtype(series):
+            return series
+
+        # Remove pontos de milhar e substitui vírgula decimal por ponto
+        cleaned = series.astype('string[pyarrow]').str.strip().str.translate(BR_TO_EN_US)
+        out = pd.to_numeric(cleaned, errors='coerce')
+        out = pd.Series(out.to_numpy(dtype='float64', na_value=np.nan), index=series.index)
+
+        # Valores que falharam (ex: com símbolo de moeda) passam pelo parser
+        # compilado, sem loop Python por célula
+        mask = out.isna() & series.notna()
+        if mask.any():
+            valores = [v.strip().encode('utf-8') for v in series[mask].astype(str)]
+            offsets = np.zeros(len(valores) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(v) for v in valores])
+            buf = np.frombuffer(b''.join(valores), dtype=np.uint8)
+            out.loc[mask] = _parse_br_numbers(buf, offsets)
+
+        # Mantém original onde a conversão falhar; a coluna só deixa de ser
+        # numérica se algum valor realmente não pôde ser convertido
+        falhou = out.isna() & series.notna()
+        if not falhou.any():
+            return out
+        return out.astype(object).where(~falhou, series)
 
     def process_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -134,9 +337,24 @@ class CSVProcessor:
         :param df: DataFrame com os dados originais
         :return: DataFrame com os dados processados
         """
-        query = "select * from depara.codigo_pais"
-        estado_para_pais = self.fetch_reference_data(query,'estado')
+        # O cabeçalho se repete entre blocos e arquivos do lote: a função
+        # especializada é gerada uma vez e reaproveitada
+        colunas = tuple(df.columns)
+        fast_process = self._fast_process.get(colunas)
+        if fast_process is None:
+            fast_process = self._fast_process[colunas] = self._build_fast_process(colunas)
+        
+        return fast_process(df)
 
+    def _build_fast_process(self, colunas: tuple):
+        """
+        Gera uma função que processa um DataFrame com o cabeçalho informado,
+        com o tratamento de cada coluna e a coluna de ESTADO já resolvidos
+        (chamadas em sequência, sem buscas no dicionário nem testes por coluna)
+        
+        :param colunas: nomes das colunas do DataFrame
+        :return: função que recebe o DataFrame original e retorna o processado
+        """
         tratamentos_padronizados = {
              'CAPITAL SEGURADO (MOEDA ORIGEM)': self._convert_br_to_en_us
             ,'VALOR ESTIMADO (US$ )': self._convert_br_to_en_us
@@ -145,37 +363,50 @@ class CSVProcessor:
             ,'FEE (BRL)': self._convert_br_to_en_us
             ,'TAXA DE CÂMBIO': self._convert_br_to_en_us
         }
- 
-        # 3. Processar cada coluna
-        for coluna in df.columns:
-            # Aplicar tratamento específico se a coluna estiver no dicionário
-            if coluna in tratamentos_padronizados:
-                df[coluna] = tratamentos_padronizados[coluna](df[coluna])
-            else:
-                # Tratamento genérico para colunas não mapeadas
-                df[coluna] = self._tratar_generico(df[coluna])
+        
+        namespace = {'pd': pd, 'estado_map': self._estado_id}
+        
+        # 3. Processar cada coluna, montando o DataFrame de saída de uma vez
+        # (atribuir coluna a coluna no df recria os blocos internos a cada passo)
+        linhas = ["def _fast_process(df):", "    out = {}"]
+        coluna_estado = None
+        for i, coluna in enumerate(colunas):
+            # Aplicar tratamento específico se a coluna estiver no dicionário,
+            # senão o tratamento genérico para colunas não mapeadas
+            namespace[f'_t{i}'] = tratamentos_padronizados.get(coluna, self._tratar_generico)
+            linhas.append(f"    out[{coluna!r}] = _t{i}(df[{coluna!r}])")
             
-            # Tratamento especial para coluna de ESTADO
             if 'ESTADO' in coluna.upper():
-                df['ID_PAIS'] = df[coluna].apply(
-                    lambda estado: estado_para_pais.get(str(estado).strip(), {}).get('id') 
-                    if pd.notna(estado) else None
-                )
+                coluna_estado = coluna
         
-        return df
-
+        # Tratamento especial para coluna de ESTADO (ID_PAIS vai no final).
+        # float64 fixo: o tipo não pode depender de cada bloco ter ou não
+        # estados sem correspondência (o baseline gravava 1.0 nesse caso)
+        if coluna_estado is not None:
+            linhas.append(
+                f"    out['ID_PAIS'] = out[{coluna_estado!r}].astype('string[pyarrow]')"
+                ".str.strip().map(estado_map).astype('float64')"
+            )
+        linhas.append("    return pd.DataFrame(out, index=df.index)")
+        
+        exec(compile("\n".join(linhas), '<_fast_process>', 'exec'), namespace)
+        return namespace['_fast_process']
 
     def _tratar_generico(self, series):
         """
         Limpeza genérica para colunas não mapeadas
         """
-        if series.dtype == 'object':
-            return series.astype(str).str.strip()
+        # Checa o tipo pelo dtype (vale também para os dtypes de texto do
+        # pandas/pyarrow, que não são 'object')
+        if pd.api.types.is_string_dtype(series.dtype):
+            return series.str.strip()
         return series
                 
     def _tratar_texto(self, serie):
         """Tratamentos genéricos para colunas de texto"""
-        serie = serie.astype(str)
+        # Só converte se a coluna ainda não for de texto
+        if not pd.api.types.is_string_dtype(serie.dtype):
+            serie = serie.astype('string[pyarrow]')
         
         # Remover espaços extras
         serie = serie.str.strip()
@@ -183,10 +414,17 @@ class CSVProcessor:
         # Substituir valores vazios por NA
         serie = serie.replace(['', 'null', 'NULL', 'nan', 'NaN', 'NA', 'N/A'], pd.NA)
         
+        # Detecta o padrão de caixa numa amostra, sem varrer a coluna inteira
+        amostra = serie.dropna().head(1024)
+        if amostra.empty:
+            # Coluna toda nula: não há caixa a detectar (e a média de uma
+            # amostra vazia seria NA)
+            return serie
+        
         # Converter para maiúsculas se parecer ser um código
-        if serie.str.isupper().mean() > 0.7:  # Se 70% dos valores são uppercase
+        if amostra.str.isupper().mean() > 0.7:  # Se 70% dos valores são uppercase
             serie = serie.str.upper()
-        elif serie.str.istitle().mean() > 0.7:  # Se 70% estão em title case
+        elif amostra.str.istitle().mean() > 0.7:  # Se 70% estão em title case
             serie = serie.str.title()
         
         return serie
@@ -208,71 +446,244 @@ class CSVProcessor:
         # Converter para numérico
         serie = pd.to_numeric(serie, errors='coerce')
         
-        # Arredondar para 2 casas decimais se tiver muitas casas
-        if (serie.dropna() % 0.01 != 0).mean() > 0.5:
+        # Arredondar para 2 casas decimais se tiver muitas casas, checando
+        # uma amostra direto no array numpy (sem máscara intermediária)
+        arr = serie.to_numpy(dtype='float64', na_value=np.nan)
+        amostra = arr[~np.isnan(arr)][:4096] * 100
+        if amostra.size and np.mean(np.abs(amostra - np.round(amostra)) > 1e-6) > 0.5:
             serie = serie.round(2)
             
         return serie
 
     def _tratar_datas(self, serie):
         """Tentativa de parse automático de datas"""
-        # Primeiro tenta o formato mais comum no Brasil
-        data_br = pd.to_datetime(serie, format='%d/%m/%Y', errors='coerce')
+        # Um único parse, priorizando o formato brasileiro (dia primeiro);
+        # cache=True converte cada data repetida uma só vez
+        return pd.to_datetime(serie, dayfirst=True, errors='coerce', cache=True)
         
-        # Se não funcionar, tenta outros formatos
-        if data_br.isna().mean() > 0.5:
-            data_br = pd.to_datetime(serie, errors='coerce')
-            
-        return data_br
+    def _run_pipeline(self, chunks, process, write):
+        """
+        Lê, processa e grava os blocos em três estágios sobrepostos: uma
+        thread lê o próximo bloco e outra grava o anterior enquanto o atual é
+        processado (o parser do pandas e a escrita no arquivo liberam o GIL).
+        
+        :param chunks: iterável com os blocos lidos
+        :param process: função aplicada a cada bloco
+        :param write: função que grava cada bloco processado
+        """
+        lidos = queue.Queue(maxsize=2)
+        processados = queue.Queue(maxsize=2)
+        parar = threading.Event()
+
+        def put(fila, item):
+            # Desiste se algum estágio falhou, para não travar numa fila cheia
+            while not parar.is_set():
+                try:
+                    fila.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def get(fila):
+            while True:
+                try:
+                    return fila.get(timeout=0.1)
+                except queue.Empty:
+                    if parar.is_set():
+                        return _FIM
+
+        def ler():
+            try:
+                for chunk in chunks:
+                    if parar.is_set():
+                        break
+                    put(lidos, chunk)
+            except BaseException:
+                parar.set()
+                raise
+            finally:
+                put(lidos, _FIM)
+
+        def gravar():
+            try:
+                while (item := get(processados)) is not _FIM:
+                    write(item)
+            except BaseException:
+                parar.set()
+                raise
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leitor = executor.submit(ler)
+            gravador = executor.submit(gravar)
+            try:
+                while (chunk := get(lidos)) is not _FIM:
+                    put(processados, process(chunk))
+                put(processados, _FIM)
+            except BaseException:
+                parar.set()
+                raise
+
+            # Propaga erros da leitura/gravação
+            leitor.result()
+            gravador.result()
+
+    def _read_files_uring(self, filenames: List[str]) -> List[bytearray]:
+        """
+        Lê o conteúdo completo de vários arquivos do diretório de entrada via
+        io_uring: todas as leituras do lote são submetidas numa única chamada
+        e o kernel as completa em paralelo.
+        
+        Erros de um arquivo (inexistente, sem permissão, falha na leitura)
+        não derrubam o lote: o conteúdo dele volta como None e process_file o
+        lê pelo caminho síncrono, onde o erro é tratado normalmente. Só falhas
+        do próprio io_uring (criação do anel, submissão, espera) levantam
+        OSError.
+        
+        :param filenames: arquivos a ler (no máximo uring_depth)
+        :return: conteúdo de cada arquivo (ou None), na mesma ordem
+        """
+        def checar(ret):
+            # Conforme a versão, o liburing devolve -errno em vez de levantar
+            if isinstance(ret, int) and ret < 0:
+                raise OSError(-ret, os.strerror(-ret))
+            return ret
+
+        fds = [None] * len(filenames)
+        buffers = [None] * len(filenames)
+        iovecs = []  # Mantém os iovec vivos até as leituras terminarem
+        ring = liburing.io_uring()
+        cqes = liburing.io_uring_cqes()
+        checar(liburing.io_uring_queue_init(max(len(filenames), 1), ring, 0))
+        try:
+            pendentes = 0
+            for i, filename in enumerate(filenames):
+                try:
+                    fds[i] = os.open(os.path.join(self.input_dir, filename), os.O_RDONLY)
+                    buffers[i] = bytearray(os.fstat(fds[i]).st_size)
+                except OSError:
+                    continue
+                if not buffers[i]:
+                    continue
+                
+                iov = liburing.iovec(buffers[i])
+                iovecs.append(iov)
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_read(sqe, fds[i], iov[0].iov_base, iov[0].iov_len, 0)
+                sqe.user_data = i
+                pendentes += 1
+
+            enviados = 0
+            while enviados < pendentes:
+                n = checar(liburing.io_uring_submit(ring))
+                if not n:
+                    raise OSError("io_uring_submit não enviou nenhuma leitura")
+                enviados += n
+
+            # Espera todas as leituras antes de qualquer retorno: o anel só pode
+            # ser fechado quando o kernel não escreve mais nos buffers
+            lidos = [0] * len(filenames)
+            for _ in range(pendentes):
+                while True:
+                    try:
+                        checar(liburing.io_uring_wait_cqe(ring, cqes))
+                        break
+                    except InterruptedError:
+                        continue
+                cqe = cqes[0]
+                lidos[cqe.user_data] = cqe.res
+                liburing.io_uring_cqe_seen(ring, cqe)
+
+            # Leitura curta: completa o restante de forma síncrona, repetindo
+            # o pread até encher o buffer (que nunca muda de tamanho)
+            for i, (fd, buf, n) in enumerate(zip(fds, buffers, lidos)):
+                if buf is None:
+                    continue
+                try:
+                    if n < 0:
+                        raise OSError(-n, os.strerror(-n))
+                    while n < len(buf):
+                        parte = os.pread(fd, len(buf) - n, n)
+                        if not parte:
+                            raise OSError(f"Arquivo encolheu durante a leitura ({n} de {len(buf)} bytes)")
+                        buf[n:n + len(parte)] = parte
+                        n += len(parte)
+                except OSError:
+                    buffers[i] = None
+        finally:
+            liburing.io_uring_queue_exit(ring)
+            for fd in fds:
+                if fd is not None:
+                    os.close(fd)
         
-    def process_file(self, filename: str):
+        return buffers
+
+    def process_file(self, filename: str, data: bytes = None):
         """
         Processa um único arquivo CSV, tratando BOM se existir.
+        
+        :param filename: nome do arquivo no diretório de entrada
+        :param data: conteúdo do arquivo já lido (opcional; se omitido, lê do disco)
         """
         try:
             input_path = os.path.join(self.input_dir, filename)
+            source = io.BytesIO(data) if data is not None else input_path
             output_path = os.path.join(self.output_dir, filename)
             
             logger.info(f"Processando arquivo: {filename}")
             
-            # Detecta automaticamente o BOM
-            with open(input_path, 'rb') as f:
-                raw = f.read(4)
-                encoding = 'utf-8-sig' if raw.startswith(b'\xef\xbb\xbf') else 'utf-8'
-            
             # Configurações de leitura do CSV
             csv_config = {
                 'delimiter': os.getenv('CSV_DELIMITER', ';'),
-                'encoding': encoding,  # Usa a codificação detectada
                 'na_values': os.getenv('CSV_NA_VALUES', 'NA,N/A,NULL,null').split(',')
             }
             
-            # Ler CSV com tratamento de BOM
-            df = pd.read_csv(
-                input_path,
-                delimiter=csv_config['delimiter'],
-                encoding=csv_config['encoding'],
-                dtype=str,
-                na_values=csv_config['na_values']
-            )
-            # Processar dados
-            processed_df = self.process_data(df)
+            read_options = {
+                'delimiter': csv_config['delimiter'],
+                'dtype': 'string[pyarrow]',  # Texto em buffers Arrow contíguos
+                'na_values': csv_config['na_values'],
+            }
+
+            # Ler CSV em blocos. 'utf-8-sig' remove o BOM se existir e lê UTF-8
+            # comum sem alteração, dispensando abrir o arquivo só para
+            # detectá-lo. Com CSV_CHUNKSIZE=0 o arquivo é lido de uma vez pelo
+            # parser multithread do PyArrow (que não suporta leitura em blocos
+            # e já ignora o BOM sozinho)
+            if self.chunksize > 0:
+                reader = pd.read_csv(source, encoding='utf-8-sig', chunksize=self.chunksize, **read_options)
+            else:
+                reader = nullcontext([pd.read_csv(source, encoding='utf-8', engine='pyarrow', **read_options)])
+
             # Configurações de escrita (sem BOM na saída)
-            
             output_config = {
                 'encoding': 'utf-8',  # Sem BOM na saída
-                'quoting': int(os.getenv('OUTPUT_QUOTING', str(csv.QUOTE_NONNUMERIC))),
                 'delimiter': ';',  # Adiciona o delimitador ponto-e-vírgula
             }
-            
-            # Salvar arquivo processado
-            processed_df.to_csv(
-                output_path,
-                index=False,
-                sep=output_config['delimiter'],  # Usa o delimitador configurado
-                encoding=output_config['encoding'],
-                #quoting=output_config['quoting'],
-            )
+
+            # Grava em arquivo temporário e só renomeia sobre a saída depois de
+            # processar o arquivo inteiro: uma falha no meio não deixa saída
+            # incompleta nem apaga a anterior. O leitor é fechado mesmo se algo
+            # falhar
+            tmp_path = f"{output_path}.{os.getpid()}.tmp"
+            try:
+                with reader as chunks, open(tmp_path, 'w', encoding=output_config['encoding'], newline='') as sink:
+                    primeiro = True
+
+                    def gravar(processed_df):
+                        nonlocal primeiro
+                        # Cabeçalho só no primeiro bloco
+                        processed_df.to_csv(
+                            sink,
+                            index=False,
+                            header=primeiro,
+                            sep=output_config['delimiter'],  # Usa o delimitador configurado
+                        )
+                        primeiro = False
+
+                    self._run_pipeline(chunks, self.process_data, gravar)
+                os.replace(tmp_path, output_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
             
             logger.info(f"Arquivo processado salvo em: {output_path}")
             
@@ -280,6 +691,48 @@ class CSVProcessor:
             logger.error(f"Erro ao processar arquivo {filename}: {e}")
             raise
             
+    def _process_uring_batch(self, lote: List[str]):
+        """Lê um lote de arquivos via io_uring e processa cada um."""
+        conteudos = [None] * len(lote)
+        if self._use_uring:
+            try:
+                conteudos = self._read_files_uring(lote)
+            except OSError as e:
+                # Ex: io_uring bloqueado pelo seccomp padrão do Docker
+                logger.warning(f"Falha no io_uring ({e}), usando leitura síncrona.")
+                self._use_uring = False
+
+        for filename, data in zip(lote, conteudos):
+            self.process_file(filename, data)
+
+    def _process_files_uring(self, csv_files: List[str]):
+        """
+        Processa os arquivos lendo-os em lotes via io_uring. Cada lote tem no
+        máximo uring_depth arquivos e uring_batch_bytes bytes em memória;
+        arquivos maiores que esse limite seguem pela leitura síncrona em blocos.
+        """
+        lote = []
+        tamanho_lote = 0
+        for filename in csv_files:
+            try:
+                tamanho = os.path.getsize(os.path.join(self.input_dir, filename))
+            except OSError:
+                # Erro do arquivo: deixa process_file tratá-lo normalmente
+                tamanho = None
+            if tamanho is None or tamanho > self.uring_batch_bytes:
+                self.process_file(filename)
+                continue
+
+            if lote and (len(lote) >= self.uring_depth or tamanho_lote + tamanho > self.uring_batch_bytes):
+                self._process_uring_batch(lote)
+                lote = []
+                tamanho_lote = 0
+            lote.append(filename)
+            tamanho_lote += tamanho
+
+        if lote:
+            self._process_uring_batch(lote)
+
     def process_all_files(self):
         """Processa todos os arquivos CSV no diretório de entrada."""
         try:
@@ -292,8 +745,20 @@ class CSVProcessor:
             
             logger.info(f"Encontrados {len(csv_files)} arquivos para processar.")
             
-            for filename in csv_files:
-                self.process_file(filename)
+            # Cada arquivo é independente: com mais de um, distribui entre
+            # processos (WORKERS, padrão = número de CPUs), cada um lendo os
+            # próprios arquivos em blocos
+            workers = min(int(os.getenv('WORKERS', os.cpu_count() or 1)), len(csv_files))
+            if workers > 1:
+                if self._use_uring:
+                    logger.warning("USE_URING é ignorado com WORKERS > 1; cada worker lê os próprios arquivos.")
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                    list(executor.map(_process_one, csv_files))
+            elif self._use_uring:
+                self._process_files_uring(csv_files)
+            else:
+                for filename in csv_files:
+                    self.process_file(filename)
                 
             logger.info("Processamento concluído com sucesso!")
             
@@ -302,10 +767,29 @@ class CSVProcessor:
             raise
 
 
+# Processador de cada processo do pool (o pool de conexões e o cache não são
+# compartilhados entre processos)
+_worker_processor = None
+
+
+def _init_worker():
+    """Cria o CSVProcessor do processo worker."""
+    global _worker_processor
+    _worker_processor = CSVProcessor()
+
+
+def _process_one(filename: str):
+    """Processa um arquivo usando o CSVProcessor do processo worker."""
+    _worker_processor.process_file(filename)
+
+
 # Exemplo de uso
 if __name__ == "__main__":
     # Criar e executar processador
     processor = CSVProcessor()
     
     # Processar todos os arquivos
-    processor.process_all_files()
\ No newline at end of file
+    try:
+        processor.process_all_files()
+    finally:
+        processor.close()
\ No newline at end of file